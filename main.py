@@ -16,17 +16,20 @@ Usage:
 import logging
 import signal
 import sys
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+import psutil
 from playwright.sync_api import sync_playwright
 
 from src.config import load_config
-from src.auth import create_browser_context, login_if_needed
+from src.auth import create_browser_context, login_if_needed, is_session_fresh
+from src.browser_pool import PagePool
 from src.tracker import Tracker
-from src.dm_monitor import fetch_new_reel_shares
-from src.downloader import download_reel, cleanup_file
+from src.dm_monitor import fetch_new_reel_shares_if_changed
+from src.downloader import DOWNLOAD_WORKERS, fetch_reel_info, download_video, cleanup_file
 from src.uploader import build_caption, upload_reel
-from src.webhook import init_webhook, report_progress
+from src.webhook import init_webhook, report_progress, flush_webhook
 
 # ──────────────────────────────────────────────
 # Logging setup
@@ -47,26 +50,184 @@ logger = logging.getLogger(__name__)
 # Graceful shutdown
 # ──────────────────────────────────────────────
 
-running = True
+shutdown = threading.Event()
 
 
 def shutdown_handler(sig, frame):
-    global running
     logger.info("\n🛑 Shutting down gracefully...")
-    running = False
+    shutdown.set()
 
 
 signal.signal(signal.SIGINT, shutdown_handler)
 signal.signal(signal.SIGTERM, shutdown_handler)
 
+# ──────────────────────────────────────────────
+# Browser session
+# ──────────────────────────────────────────────
+
+# Relaunch the persistent context periodically: Chromium accumulates state
+# across navigations and RSS only grows on a long-running bot.
+CONTEXT_RECYCLE_POLLS = 100
+CONTEXT_RECYCLE_RSS_BYTES = int(1.5 * 1024 ** 3)
+
+
+def start_browser_session(pw, config):
+    """
+    Launch the persistent browser context, log in, and park on the home page.
+    Returns (context, page, upload_pool): `page` stays on DM monitoring while
+    uploads lease the pre-loaded upload page from `upload_pool`.
+    """
+    context = create_browser_context(pw, headless=True)
+    try:
+        page = login_if_needed(context, config["username"], config["password"])
+
+        # Navigate to Instagram home to be ready, unless a verified session
+        # already left us on an Instagram page
+        if not (is_session_fresh() and page.url.startswith("https://www.instagram.com/")):
+            page.goto("https://www.instagram.com/", wait_until="load", timeout=30000)
+            page.wait_for_timeout(2000)
+        upload_pool = PagePool(context)
+        upload_pool.warm_up()
+        return context, page, upload_pool
+    except Exception:
+        # Release the browser_data profile lock so the next launch can take it
+        try:
+            context.close()
+        except Exception as e:
+            logger.warning(f"⚠️  Failed to close browser context: {e}")
+        raise
+
+
+def relaunch_browser_session(pw, config):
+    """
+    start_browser_session, retried with a poll_interval back-off until it
+    succeeds (e.g. the old profile lock is released). Returns None if
+    shutdown is requested first.
+    """
+    while not shutdown.is_set():
+        try:
+            return start_browser_session(pw, config)
+        except Exception as e:
+            logger.error(f"❌ Failed to relaunch browser: {e}", exc_info=True)
+            report_progress('error', f'Browser relaunch failed: {str(e)[:50]}...')
+            logger.info(f"\n   💤 Sleeping {config['poll_interval']}s before retrying...\n")
+            shutdown.wait(timeout=config["poll_interval"])
+    return None
+
+
+def browser_rss_bytes() -> int:
+    """Resident memory of this process plus its Chromium children."""
+    proc = psutil.Process()
+    total = proc.memory_info().rss
+    for child in proc.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            continue
+    return total
+
+
 # ──────────────────────────────────────────────
 # Main loop
 # ──────────────────────────────────────────────
 
 
-def main():
-    global running
+def discard_download(download):
+    """Remove the file behind a download future, if it produced one."""
+    try:
+        result = download.result()
+    except Exception:
+        return
+    cleanup_file((result or {}).get("video_path"))
+
+
+def process_reels(page, upload_pool, new_reels, tracker, config):
+    """
+    Download and repost a batch of reel shares.
+
+    Reel metadata is resolved serially on the browser page, and each reel's
+    CDN download is handed to a thread pool as soon as its metadata is in,
+    so downloads overlap the remaining lookups. Uploads then consume the
+    finished downloads in order on this thread, which owns the Playwright pages;
+    each upload runs on the warm page leased from `upload_pool`.
+    """
+    sender = config["allowed_sender"]
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        # 2. Resolve reel metadata (browser page — serial) and start downloads
+        jobs = []
+        for reel_data in new_reels:
+            message_id = reel_data["message_id"]
+            shortcode = reel_data.get("shortcode", "")
+            media_id = reel_data.get("media_id", "")
+
+            if not shortcode and not media_id:
+                logger.error("   No shortcode or media_id — skipping.")
+                tracker.mark_processed(message_id)
+                continue
+
+            report_progress('downloading', f'Fetching reel info...', reel_id=message_id, sender=sender)
+            info = fetch_reel_info(page, shortcode, media_id)
+
+            if not info:
+                logger.error("   Skipping reel (download failed).")
+                tracker.mark_processed(message_id)
+                continue
+
+            jobs.append((message_id, pool.submit(download_video, info)))
+
+        # 3. Upload one at a time as downloads finish
+        try:
+            for i, (message_id, download) in enumerate(jobs, 1):
+                result = download.result()
+
+                # Leave the rest for the next run; their downloads are dropped below
+                if shutdown.is_set():
+                    break
+
+                logger.info(f"\n   ━━━ Processing reel {i}/{len(jobs)} ━━━")
+
+                if not result:
+                    logger.error("   Skipping reel (download failed).")
+                    tracker.mark_processed(message_id)
+                    continue
+
+                # 4. Build caption with credit
+                caption = build_caption(
+                    original_caption=result["caption"],
+                    creator_username=result["creator_username"],
+                )
+
+                # 5. Upload as reel on bot account
+                report_progress('uploading', 'Uploading and processing video...', reel_id=message_id, sender=sender)
+                with upload_pool.lease() as upload_page:
+                    success = upload_reel(upload_page, result["video_path"], caption)
+
+                # 6. Mark as processed
+                tracker.mark_processed(message_id)
+
+                if success:
+                    logger.info("   🎉 Reel reposted successfully!")
+                    report_progress('completed', 'Reel reposted successfully!', reel_id=message_id, sender=sender)
+                else:
+                    logger.error("   ❌ Failed to repost reel.")
+                    report_progress('error', 'Failed to repost reel.', reel_id=message_id, sender=sender)
+
+                # 7. Clean up
+                cleanup_file(result["video_path"])
 
+                # Small delay between multiple reposts
+                if i < len(jobs):
+                    logger.info("   ⏳ Waiting 10s before next reel...")
+                    shutdown.wait(10)
+        finally:
+            # Downloads the loop never got to (shutdown, or an exception
+            # escaped) must not linger in tmpfs; uploaded ones are already gone
+            for _, download in jobs:
+                discard_download(download)
+
+
+def main():
     print()
     print("  ╔══════════════════════════════════════╗")
     print("  ║   📸 Instagram Repost Bot v1.0       ║")
@@ -80,21 +241,15 @@ def main():
     logger.info(f"⚙️  Bot account: @{config['username']}")
     logger.info(f"⚙️  Allowed sender: @{config['allowed_sender']}")
     logger.info(f"⚙️  Poll interval: {config['poll_interval']}s")
+    logger.info(f"⚙️  Inbox probe interval: {config['probe_interval']}s")
 
     init_webhook()
     report_progress('idle', 'Warming up browser...')
 
     with sync_playwright() as pw:
-        # Create persistent browser context
+        # Create persistent browser context and log in
         logger.info("🌐 Launching browser...")
-        context = create_browser_context(pw, headless=True)
-
-        # Login
-        page = login_if_needed(context, config["username"], config["password"])
-
-        # Navigate to Instagram home to be ready
-        page.goto("https://www.instagram.com/", wait_until="load", timeout=30000)
-        page.wait_for_timeout(2000)
+        context, page, upload_pool = start_browser_session(pw, config)
 
         # Initialize tracker
         tracker = Tracker()
@@ -106,75 +261,27 @@ def main():
         report_progress('idle', 'Monitoring DMs for reel shares...')
 
         poll_count = 0
+        polls_since_context_restart = 0
 
-        while running:
+        while not shutdown.is_set():
             poll_count += 1
             logger.info(f"── Poll #{poll_count} ──────────────────────────")
+            poll_failed = False
+            new_reels = []
 
             try:
                 # 1. Check for new reel shares
-                new_reels = fetch_new_reel_shares(page, config["allowed_sender"], tracker)
+                new_reels = fetch_new_reel_shares_if_changed(page, config["allowed_sender"], tracker)
 
                 if not new_reels:
                     logger.info("   No new reel shares found.")
                 else:
                     logger.info(f"   Found {len(new_reels)} new reel(s) to process!")
-
-                    for i, reel_data in enumerate(new_reels, 1):
-                        logger.info(f"\n   ━━━ Processing reel {i}/{len(new_reels)} ━━━")
-
-                        message_id = reel_data["message_id"]
-                        shortcode = reel_data.get("shortcode", "")
-                        media_id = reel_data.get("media_id", "")
-
-                        if not shortcode and not media_id:
-                            logger.error("   No shortcode or media_id — skipping.")
-                            tracker.mark_processed(message_id)
-                            continue
-
-                        # 2. Download the reel
-                        report_progress('downloading', f'Fetching reel info...', reel_id=message_id, sender=config['allowed_sender'])
-                        result = download_reel(page, shortcode, media_id)
-
-                        if not result:
-                            logger.error("   Skipping reel (download failed).")
-                            tracker.mark_processed(message_id)
-                            continue
-
-                        # 3. Build caption with credit
-                        caption = build_caption(
-                            original_caption=result["caption"],
-                            creator_username=result["creator_username"],
-                        )
-
-                        # 4. Upload as reel on bot account
-                        report_progress('uploading', 'Uploading and processing video...', reel_id=message_id, sender=config['allowed_sender'])
-                        success = upload_reel(page, result["video_path"], caption)
-
-                        # 5. Mark as processed
-                        tracker.mark_processed(message_id)
-
-                        if success:
-                            logger.info("   🎉 Reel reposted successfully!")
-                            report_progress('completed', 'Reel reposted successfully!', reel_id=message_id, sender=config['allowed_sender'])
-                        else:
-                            logger.error("   ❌ Failed to repost reel.")
-                            report_progress('error', 'Failed to repost reel.', reel_id=message_id, sender=config['allowed_sender'])
-
-                        # 6. Clean up
-                        cleanup_file(result["video_path"])
-
-                        # Navigate back home for next iteration
-                        page.goto("https://www.instagram.com/", wait_until="load", timeout=30000)
-                        page.wait_for_timeout(2000)
-
-                        # Small delay between multiple reposts
-                        if i < len(new_reels):
-                            logger.info("   ⏳ Waiting 10s before next reel...")
-                            time.sleep(10)
+                    process_reels(page, upload_pool, new_reels, tracker, config)
 
             except Exception as e:
                 logger.error(f"❌ Error during poll: {e}", exc_info=True)
+                poll_failed = True
                 report_progress('error', f'Error during poll: {str(e)[:50]}...', sender=config['allowed_sender'])
 
                 # Try to recover by navigating home
@@ -183,20 +290,44 @@ def main():
                 except Exception:
                     pass
 
-            # Wait before next poll
-            if running:
-                logger.info(f"\n   💤 Sleeping {config['poll_interval']}s until next poll...\n")
+            # Back off before retrying after a failed poll
+            if poll_failed:
+                logger.info(f"\n   💤 Sleeping {config['poll_interval']}s before retrying...\n")
+                if shutdown.wait(timeout=config["poll_interval"]):
+                    break
+            else:
                 if poll_count % 5 == 0:
-                    report_progress('idle', f'Sleeping {config["poll_interval"]}s... (Poll #{poll_count})')
-                for _ in range(config["poll_interval"]):
-                    if not running:
-                        break
-                    time.sleep(1)
+                    report_progress('idle', f'Monitoring DMs... (Poll #{poll_count})')
+                # Pace the inbox probes; after a batch, check again straight away
+                if not new_reels and shutdown.wait(timeout=config["probe_interval"]):
+                    break
+
+            # Recycle the browser context to cap memory growth
+            polls_since_context_restart += 1
+            if not shutdown.is_set() and (
+                polls_since_context_restart >= CONTEXT_RECYCLE_POLLS
+                or browser_rss_bytes() > CONTEXT_RECYCLE_RSS_BYTES
+            ):
+                logger.info("♻️  Recycling browser context...")
+                try:
+                    context.close()
+                except Exception as e:
+                    logger.warning(f"⚠️  Failed to close browser context: {e}")
+                session = relaunch_browser_session(pw, config)
+                if session is None:
+                    break
+                context, page, upload_pool = session
+                polls_since_context_restart = 0
 
         # Cleanup
+        tracker.close()
         logger.info("Closing browser...")
-        context.close()
+        try:
+            context.close()
+        except Exception as e:
+            logger.warning(f"⚠️  Failed to close browser context: {e}")
 
+    flush_webhook()
     logger.info("👋 Bot stopped. Goodbye!")
 
 
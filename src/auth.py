@@ -5,6 +5,8 @@ Uses a persistent browser context to maintain login across restarts.
 
 import logging
 import os
+import re
+import time
 
 from playwright.sync_api import sync_playwright, BrowserContext, Page
 
@@ -12,6 +14,35 @@ logger = logging.getLogger(__name__)
 
 BROWSER_STATE_DIR = "browser_data"
 
+CURRENT_USER_URL = "https://www.instagram.com/api/v1/accounts/current_user/?edit=true"
+
+# Trim per-process overhead of the long-lived headless Chromium. Images are
+# switched off in Blink itself rather than with context.route(): routing
+# disables the HTTP cache and sends every request through the driver, so each
+# navigation would re-download Instagram's JS/CSS bundles.
+CHROMIUM_ARGS = [
+    "--no-zygote",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--blink-settings=imagesEnabled=false",
+]
+
+LOGGED_IN_SELECTORS = [
+    'a[href="/direct/inbox/"]',
+    'svg[aria-label="Home"]',
+    'svg[aria-label="Direct"]',
+    'svg[aria-label="New post"]',
+    'a[href="/explore/"]',
+]
+
+COOKIE_BUTTON_PATTERN = re.compile(r"Allow (essential and optional|all) cookies|Accept( All)?")
+
+# Once a login is verified, the session is treated as established for this
+# long: post-login dialogs are not probed again on re-entry.
+SESSION_FRESH_SECONDS = 24 * 3600
+
+_SESSION_STATE = {"verified_at": 0.0}
+
 
 def create_browser_context(playwright, headless=True):
     """
@@ -26,11 +57,21 @@ def create_browser_context(playwright, headless=True):
         viewport={"width": 1280, "height": 900},
         user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         locale="en-US",
+        args=CHROMIUM_ARGS,
     )
 
     return browser_context
 
 
+def is_session_fresh() -> bool:
+    """True if a login was verified within SESSION_FRESH_SECONDS in this process."""
+    return time.time() - _SESSION_STATE["verified_at"] < SESSION_FRESH_SECONDS
+
+
+def _mark_session_verified():
+    _SESSION_STATE["verified_at"] = time.time()
+
+
 def login_if_needed(context: BrowserContext, username: str, password: str) -> Page:
     """
     Check if already logged in. If not, perform login.
@@ -38,6 +79,14 @@ def login_if_needed(context: BrowserContext, username: str, password: str) -> Pa
     """
     page = context.new_page()
 
+    # Fast path: ask the API whether the stored cookies are still good
+    if _has_valid_session(context):
+        logger.info("Already logged in!")
+        page.goto("https://www.instagram.com/", timeout=30000)
+        _dismiss_dialogs(page)
+        _mark_session_verified()
+        return page
+
     # Go to Instagram login page directly
     logger.info("Navigating to Instagram...")
     page.goto("https://www.instagram.com/accounts/login/", timeout=30000)
@@ -49,6 +98,7 @@ def login_if_needed(context: BrowserContext, username: str, password: str) -> Pa
         if _is_logged_in(page):
             logger.info("Already logged in!")
             _dismiss_dialogs(page)
+            _mark_session_verified()
             return page
 
     # Handle cookie consent banner
@@ -62,6 +112,7 @@ def login_if_needed(context: BrowserContext, username: str, password: str) -> Pa
         if _is_logged_in(page):
             logger.info("Already logged in!")
             _dismiss_dialogs(page)
+            _mark_session_verified()
             return page
         else:
             # Try navigating to login page again
@@ -88,6 +139,7 @@ def login_if_needed(context: BrowserContext, username: str, password: str) -> Pa
 
     if _is_logged_in(page):
         logger.info("Login successful!")
+        _mark_session_verified()
     else:
         # Check for challenge/verification page
         current_url = page.url
@@ -100,21 +152,46 @@ def login_if_needed(context: BrowserContext, username: str, password: str) -> Pa
     return page
 
 
+def _has_valid_session(context: BrowserContext) -> bool:
+    """
+    Check the stored cookies against the current-user API.
+    Uses the context's request client, which shares its cookie jar, so no
+    page has to load first.
+    """
+    try:
+        resp = context.request.get(
+            CURRENT_USER_URL,
+            headers={
+                "x-ig-app-id": "936619743392459",
+                "x-requested-with": "XMLHttpRequest",
+            },
+            max_redirects=0,
+            timeout=10000,
+        )
+        return resp.status == 200 and "user" in resp.json()
+    except Exception:
+        return False
+
+
 def _dismiss_cookie_banner(page: Page):
-    """Dismiss the cookie consent banner if present."""
+    """Dismiss the cookie consent banner if present (one combined locator)."""
     try:
-        for text in ["Allow essential and optional cookies", "Allow all cookies", "Accept", "Accept All"]:
-            btn = page.locator(f'button:has-text("{text}")')
-            if btn.first.is_visible(timeout=2000):
-                btn.first.click()
-                page.wait_for_timeout(1000)
-                return
+        btn = page.locator("button:visible").filter(has_text=COOKIE_BUTTON_PATTERN)
+        if btn.count():
+            btn.first.click(timeout=2000)
+            page.wait_for_timeout(1000)
     except Exception:
         pass
 
 
 def _dismiss_dialogs(page: Page):
-    """Dismiss the 'Save login info' and 'Turn on notifications' dialogs."""
+    """
+    Dismiss the 'Save login info' and 'Turn on notifications' dialogs.
+    Skipped while the session is fresh — they were handled on first login.
+    """
+    if is_session_fresh():
+        return
+
     for _ in range(3):
         try:
             not_now = page.locator('button:has-text("Not Now"), button:has-text("Not now")')
@@ -126,22 +203,14 @@ def _dismiss_dialogs(page: Page):
 
 
 def _is_logged_in(page: Page) -> bool:
-    """Check if the current page shows a logged-in state."""
+    """Check if the current page shows a logged-in state (one in-page probe)."""
     try:
         # Look for logged-in indicators (sidebar nav, Direct inbox link, etc.)
-        for selector in [
-            'a[href="/direct/inbox/"]',
-            'svg[aria-label="Home"]',
-            'svg[aria-label="Direct"]',
-            'svg[aria-label="New post"]',
-            'a[href="/explore/"]',
-        ]:
-            try:
-                el = page.locator(selector)
-                if el.first.is_visible(timeout=1500):
-                    return True
-            except Exception:
-                continue
-        return False
+        return page.evaluate("""
+            (selectors) => selectors.some(s => {
+                const el = document.querySelector(s);
+                return el !== null && el.getClientRects().length > 0;
+            })
+        """, LOGGED_IN_SELECTORS)
     except Exception:
         return False
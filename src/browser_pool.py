@@ -0,0 +1,46 @@
+"""
+Warm, logged-in page for the upload flow.
+Uploads run one at a time on the Playwright thread, so the pool holds a
+single dedicated page. It is opened and parked on the Instagram home page
+when the browser session starts, so the first upload doesn't pay for page
+creation and SPA start-up, and later uploads reuse it as-is.
+"""
+
+import logging
+from contextlib import contextmanager
+
+from playwright.sync_api import BrowserContext, Page
+
+logger = logging.getLogger(__name__)
+
+HOME_URL = "https://www.instagram.com/"
+
+
+class PagePool:
+    """Leases the context's dedicated upload page, reopening it if it was closed."""
+
+    def __init__(self, context: BrowserContext):
+        self.context = context
+        self._page = None
+
+    def warm_up(self):
+        """Open the upload page and park it on the home page."""
+        if self._page is None or self._page.is_closed():
+            logger.info("  🗂️  Opening upload page")
+            self._page = self.context.new_page()
+        try:
+            self._page.goto(HOME_URL, wait_until="domcontentloaded", timeout=30000)
+        except Exception as e:
+            # upload_reel navigates home itself if the page isn't ready
+            logger.warning(f"⚠️  Could not pre-load upload page: {e}")
+
+    def acquire(self) -> Page:
+        """Return the upload page, warming a fresh one if it was closed."""
+        if self._page is None or self._page.is_closed():
+            self.warm_up()
+        return self._page
+
+    @contextmanager
+    def lease(self):
+        """Context manager around acquire()."""
+        yield self.acquire()
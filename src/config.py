@@ -4,11 +4,17 @@ Centralized configuration loaded from environment variables.
 
 import os
 import sys
+from functools import lru_cache
 from dotenv import load_dotenv
 
+# Each inbox probe is a request against the bot account, so probes are never
+# spaced closer than this, whatever INBOX_PROBE_SECONDS says.
+MIN_PROBE_SECONDS = 30
 
+
+@lru_cache(maxsize=1)
 def load_config() -> dict:
-    """Load and validate configuration from .env file."""
+    """Load and validate configuration from .env file (parsed once per process)."""
     load_dotenv()
 
     config = {
@@ -16,6 +22,10 @@ def load_config() -> dict:
         "password": os.getenv("IG_PASSWORD", ""),
         "allowed_sender": os.getenv("ALLOWED_SENDER", ""),
         "poll_interval": int(os.getenv("POLL_INTERVAL_SECONDS", "60")),
+        "probe_interval": max(
+            int(os.getenv("INBOX_PROBE_SECONDS", os.getenv("POLL_INTERVAL_SECONDS", "60"))),
+            MIN_PROBE_SECONDS,
+        ),
         "WEBHOOK_URL": os.getenv("WEBHOOK_URL", ""),
     }
 
@@ -10,134 +10,287 @@ from typing import List, Dict
 
 logger = logging.getLogger(__name__)
 
+# Conditional inbox check: the page first probes a one-thread inbox slice
+# and only pulls the full inbox when its `seq_id` has moved. Every fetch is
+# bounded by an AbortController.
+INBOX_FETCH_TIMEOUT_SECONDS = 30
 
-def fetch_new_reel_shares(page, allowed_sender: str, tracker) -> List[Dict]:
+# The full inbox fetch sends the last ETag and short-circuits on 304. When
+# Instagram sends no ETag, a digest of the body stands in for it, so an
+# unchanged inbox is answered with {unchanged: true} instead of being
+# serialized back to Python. A changed inbox is projected in the page down to
+# the fields _collect_reel_shares and the extractors read, keeping the same
+# key layout as the API response.
+_INBOX_JS = """
+    async ({seqId, etag, timeoutMs}) => {
+        const headers = {
+            'x-ig-app-id': '936619743392459',
+            'x-requested-with': 'XMLHttpRequest',
+        };
+
+        const digest = (text) => {
+            let h = 0x811c9dc5;
+            for (let i = 0; i < text.length; i++) {
+                h ^= text.charCodeAt(i);
+                h = Math.imul(h, 0x01000193);
+            }
+            return `fnv1a-${(h >>> 0).toString(16)}-${text.length}`;
+        };
+
+        const projectItem = (i) => {
+            const item = {item_id: i.item_id, item_type: i.item_type};
+            if (i.media_share) {
+                const m = i.media_share;
+                item.media_share = {pk: m.pk, code: m.code, media_type: m.media_type, product_type: m.product_type};
+            }
+            if (i.clip) {
+                const c = i.clip.clip || i.clip;
+                item.clip = {clip: {pk: c.pk, code: c.code}};
+            }
+            if (i.felix_share && i.felix_share.video) {
+                const v = i.felix_share.video;
+                item.felix_share = {video: {pk: v.pk, code: v.code}};
+            }
+            return item;
+        };
+
+        const project = (data) => ({
+            seq_id: data.seq_id,
+            inbox: {
+                threads: ((data.inbox || {}).threads || []).map(t => ({
+                    thread_id: t.thread_id,
+                    users: (t.users || []).map(u => ({username: u.username})),
+                    items: (t.items || []).map(projectItem),
+                })),
+            },
+        });
+
+        const fetchInbox = async (limit, messageLimit, extra = '', extraHeaders = {}) => {
+            const controller = new AbortController();
+            const timer = setTimeout(() => controller.abort(), timeoutMs);
+            try {
+                return await fetch(`/api/v1/direct_v2/inbox/?persistentBadging=true&folder=&limit=${limit}&thread_message_limit=${messageLimit}${extra}`, {
+                    headers: {...headers, ...extraHeaders},
+                    credentials: 'include',
+                    signal: controller.signal,
+                });
+            } finally {
+                clearTimeout(timer);
+            }
+        };
+
+        try {
+            if (seqId) {
+                const probe = await (await fetchInbox(1, 1)).json();
+                if (probe.seq_id === seqId) {
+                    return {unchanged: true};
+                }
+            }
+
+            const resp = await fetchInbox(
+                20, 10,
+                seqId ? `&seq_id=${seqId}` : '',
+                etag ? {'if-none-match': etag} : {},
+            );
+            if (resp.status === 304) {
+                return {unchanged: true};
+            }
+            const text = await resp.text();
+            const tag = resp.headers.get('etag') || digest(text);
+            if (tag === etag) {
+                return {unchanged: true};
+            }
+            const data = JSON.parse(text);
+            if (data.status && data.status !== 'ok') {
+                return {error: data.message || data.status};
+            }
+            return {etag: tag, data: project(data)};
+        } catch(e) {
+            if (e.name === 'AbortError') {
+                return {unchanged: true};
+            }
+            return {error: e.message};
+        }
+    }
+"""
+
+
+def fetch_new_reel_shares_if_changed(page, allowed_sender: str, tracker) -> List[Dict]:
     """
     Check the DM inbox for new reel shares from the allowed sender.
-    Uses the Instagram web API via browser fetch requests.
-    
-    Returns a list of dicts with:
-      - message_id: str
-      - media_id: str (the reel media ID)
-      - reel_url: str (direct link to the reel)
+    Probes the inbox `seq_id` inside the page and only pulls the full inbox
+    when it has moved since the last completed scan.
+
+    Returns the new reel shares, or an empty list when nothing moved; the
+    caller paces the calls. Fetch errors are raised rather than swallowed
+    so the caller can back off.
     """
-    new_reels = []
+    logger.info("  Checking DM inbox...")
+    result = page.evaluate(_INBOX_JS, {
+        "seqId": tracker.seq_id,
+        "etag": tracker.last_etag,
+        "timeoutMs": INBOX_FETCH_TIMEOUT_SECONDS * 1000,
+    })
+
+    if not result or "error" in result:
+        raise RuntimeError(f"Failed to fetch inbox: {result}")
+
+    return _handle_inbox_result(result, allowed_sender, tracker)
+
+
+def _handle_inbox_result(result: dict, allowed_sender: str, tracker) -> List[Dict]:
+    """
+    Turn an _INBOX_JS result into new reel shares.
+
+    The ETag is only recorded once a scan yields no new reels, so an inbox
+    whose reels are still pending is fetched in full again next time.
+    """
+    if result.get("unchanged"):
+        logger.info("  Inbox unchanged.")
+        return []
+
+    new_reels = _collect_reel_shares(result.get("data") or {}, allowed_sender, tracker)
+    if not new_reels:
+        tracker.last_etag = result.get("etag")
+    return new_reels
 
-    try:
-        # Use Instagram's web API to fetch DM inbox
-        logger.info("  Fetching DM inbox...")
-        inbox_data = page.evaluate("""
-            async () => {
-                try {
-                    const resp = await fetch('/api/v1/direct_v2/inbox/?persistentBadging=true&folder=&limit=20&thread_message_limit=10', {
-                        headers: {
-                            'x-ig-app-id': '936619743392459',
-                            'x-requested-with': 'XMLHttpRequest',
-                        },
-                        credentials: 'include',
-                    });
-                    return await resp.json();
-                } catch(e) {
-                    return {error: e.message};
-                }
-            }
-        """)
 
-        if not inbox_data or "error" in inbox_data:
-            logger.error(f"  Failed to fetch inbox: {inbox_data}")
-            return []
+def _collect_reel_shares(inbox_data: dict, allowed_sender: str, tracker) -> List[Dict]:
+    """
+    Scan an inbox payload for unprocessed reel shares from the allowed sender.
 
-        inbox = inbox_data.get("inbox", {})
-        threads = inbox.get("threads", [])
-        logger.info(f"  Found {len(threads)} DM threads.")
+    Only items newer than the thread's cursor on the tracker are looked at.
+    A thread's cursor advances only once a scan of it yields no new reels, and
+    the inbox seq_id only once the whole scan does, so reels handed back to
+    the caller are re-checked until marked processed.
 
-        for thread in threads:
-            # Get users in this thread
-            users = thread.get("users", [])
-            usernames = [u.get("username", "").lower() for u in users]
+    Runs in three passes: gather candidate items from the sender's threads,
+    drop processed IDs in one tracker call, then extract reels from the rest.
+    """
+    inbox = inbox_data.get("inbox", {})
+    threads = inbox.get("threads", [])
+    logger.info(f"  Found {len(threads)} DM threads.")
 
-            # Only process threads with the allowed sender
-            if allowed_sender.lower() not in usernames:
+    # Instagram usernames come back lowercase, so only the config side is folded
+    allowed_lc = allowed_sender.lower()
+
+    # Pass 1: candidate (thread_id, item) pairs past each thread's cursor
+    candidates = []
+    newest_by_thread = {}
+    for thread in threads:
+        # Only process threads with the allowed sender
+        if not any(u.get("username", "") == allowed_lc for u in thread.get("users", [])):
+            continue
+
+        thread_id = str(thread.get("thread_id", ""))
+        cursor = tracker.last_item_id(thread_id)
+        newest = cursor
+
+        for item in thread.get("items", []):
+            item_id = item.get("item_id", "")
+            if cursor and not _is_newer(item_id, cursor):
                 continue
+            if _is_newer(item_id, newest):
+                newest = item_id
+            candidates.append((thread_id, item))
+
+        if thread_id and newest != cursor:
+            newest_by_thread[thread_id] = newest
+
+    # Pass 2: drop everything already processed in one batch
+    fresh = set(tracker.filter_unprocessed(item.get("item_id", "") for _, item in candidates))
+
+    # Pass 3: extract reels from the survivors
+    new_reels = []
+    not_reels = []
+    threads_with_reels = set()
+    for thread_id, item in candidates:
+        item_id = item.get("item_id", "")
+        if item_id not in fresh:
+            continue
 
-            items = thread.get("items", [])
-            for item in items:
-                item_id = item.get("item_id", "")
-
-                # Skip already processed
-                if tracker.is_processed(item_id):
-                    continue
-
-                # Check for media share (reel/post shared via DM)
-                reel_info = _extract_reel_from_item(item)
-                if reel_info:
-                    logger.info(f"  🎬 Found reel share! Item: {item_id}")
-                    new_reels.append({
-                        "message_id": item_id,
-                        "media_id": reel_info.get("media_id", ""),
-                        "reel_url": reel_info.get("reel_url", ""),
-                        "shortcode": reel_info.get("shortcode", ""),
-                    })
-                else:
-                    # Not a reel — mark as processed
-                    tracker.mark_processed(item_id)
-
-    except Exception as e:
-        logger.error(f"  Error fetching DM inbox: {e}")
+        # Check for media share (reel/post shared via DM)
+        reel_info = _extract_reel_from_item(item)
+        if reel_info:
+            logger.info(f"  🎬 Found reel share! Item: {item_id}")
+            threads_with_reels.add(thread_id)
+            new_reels.append({
+                "message_id": item_id,
+                "media_id": reel_info.get("media_id", ""),
+                "reel_url": reel_info.get("reel_url", ""),
+                "shortcode": reel_info.get("shortcode", ""),
+            })
+        else:
+            not_reels.append(item_id)
 
+    # Not reels — mark as processed
+    tracker.mark_processed_many(not_reels)
+
+    advanced = {
+        thread_id: newest
+        for thread_id, newest in newest_by_thread.items()
+        if thread_id not in threads_with_reels
+    }
+    # Like the thread cursors, seq_id only moves once nothing is pending:
+    # the inbox check skips the full fetch until seq_id changes, so advancing
+    # it past an unprocessed reel would park that reel until another DM lands.
+    seq_id = inbox_data.get("seq_id") if not new_reels else None
+    tracker.update_cursor(seq_id, advanced)
     return new_reels
 
 
+def _is_newer(item_id: str, other: str) -> bool:
+    """Compare IG item_ids, which are monotonic numeric strings."""
+    item_id, other = str(item_id), str(other)
+    return (len(item_id), item_id) > (len(other), other)
+
+
 def _extract_reel_from_item(item: dict) -> dict:
     """
     Extract reel info from a DM item if it contains a shared reel.
     
-    DM items with shared media have item_type = "media_share" or "clip".
+    DM items with shared media have item_type = "media_share", "clip"
+    or "felix_share"; each type has its own extractor in _EXTRACTORS.
     """
-    item_type = item.get("item_type", "")
-
-    # media_share — shared post or reel
-    if item_type == "media_share":
-        media = item.get("media_share", {})
-        if not media:
-            return None
-        media_type = media.get("media_type", 0)
-        product_type = media.get("product_type", "")
-
-        # media_type 2 = video, product_type "clips" = reel
-        if media_type == 2 or product_type == "clips":
-            code = media.get("code", "")
-            pk = media.get("pk", "")
-            return {
-                "media_id": str(pk),
-                "reel_url": f"https://www.instagram.com/reel/{code}/" if code else "",
-                "shortcode": code,
-            }
+    extractor = _EXTRACTORS.get(item.get("item_type"))
+    return extractor(item) if extractor else None
 
-    # clip — dedicated reel share
-    if item_type == "clip":
-        clip = item.get("clip", {})
-        clip_media = clip.get("clip", {})
-        if not clip_media:
-            clip_media = clip
-        code = clip_media.get("code", "")
-        pk = clip_media.get("pk", "")
-        return {
-            "media_id": str(pk),
-            "reel_url": f"https://www.instagram.com/reel/{code}/" if code else "",
-            "shortcode": code,
-        }
 
-    # felix_share — IGTV/reel
-    if item_type == "felix_share":
-        felix = item.get("felix_share", {})
-        video = felix.get("video", {})
-        code = video.get("code", "")
-        pk = video.get("pk", "")
-        return {
-            "media_id": str(pk),
-            "reel_url": f"https://www.instagram.com/reel/{code}/" if code else "",
-            "shortcode": code,
-        }
+def _reel_ref(media: dict) -> dict:
+    """Build the reel reference dict from a media payload's code and pk."""
+    code = media.get("code", "")
+    return {
+        "media_id": str(media.get("pk", "")),
+        "reel_url": f"https://www.instagram.com/reel/{code}/" if code else "",
+        "shortcode": code,
+    }
+
 
+def _from_media_share(item: dict) -> dict:
+    """media_share — shared post or reel."""
+    media = item.get("media_share")
+    if not media:
+        return None
+
+    # media_type 2 = video, product_type "clips" = reel
+    if media.get("media_type") == 2 or media.get("product_type") == "clips":
+        return _reel_ref(media)
     return None
+
+
+def _from_clip(item: dict) -> dict:
+    """clip — dedicated reel share."""
+    clip = item.get("clip", {})
+    return _reel_ref(clip.get("clip") or clip)
+
+
+def _from_felix(item: dict) -> dict:
+    """felix_share — IGTV/reel."""
+    return _reel_ref(item.get("felix_share", {}).get("video", {}))
+
+
+_EXTRACTORS = {
+    "media_share": _from_media_share,
+    "clip": _from_clip,
+    "felix_share": _from_felix,
+}
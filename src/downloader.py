@@ -7,26 +7,67 @@ import json
 import logging
 import os
 import re
-import requests
+import tempfile
 from typing import Optional, Dict
 
+import diskcache
+import httpx
+
 logger = logging.getLogger(__name__)
 
 DOWNLOADS_DIR = "downloads"
+MEDIA_CACHE_DIR = "cache/media_info"
+MEDIA_CACHE_TTL = 3600
+
+# Reels below SHM_MAX_BYTES are written to tmpfs so the download and the
+# upload read-back never touch the block device.
+SHM_DIR = "/dev/shm"
+SHM_MAX_BYTES = 200 * 1024 * 1024
+
+# CDN downloads run in a thread pool; metadata fetches stay on the browser page.
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# One keep-alive HTTP/2 client shared by every download thread, so reels after
+# the first skip the TCP+TLS handshake to the CDN.
+_http = httpx.Client(
+    http2=True,
+    follow_redirects=True,
+    timeout=60,
+    limits=httpx.Limits(max_keepalive_connections=8),
+)
+
+# Resolved reel info keyed by (shortcode, media_id), so a reel shared twice or
+# replayed after a restart skips the media-info API round-trip.
+_media_cache = diskcache.Cache(MEDIA_CACHE_DIR, size_limit=128 << 20)
 
 
 def ensure_downloads_dir():
     os.makedirs(DOWNLOADS_DIR, exist_ok=True)
 
 
-def download_reel(page, shortcode: str, media_id: str = "") -> Optional[Dict]:
+def fetch_reel_info(page, shortcode: str, media_id: str = "") -> Optional[Dict]:
     """
-    Download a reel by navigating to it and extracting the video URL.
-    
-    Returns dict with video_path, caption, creator_username, or None on failure.
+    Resolve a reel's video URL and metadata through the browser page.
+
+    Returns dict with video_url, shortcode, caption, creator_username,
+    or None on failure. Must run on the thread that owns the page.
+    Successful lookups are cached on disk for MEDIA_CACHE_TTL seconds.
     """
-    ensure_downloads_dir()
+    key = (shortcode, media_id)
+    info = _media_cache.get(key)
+    if info is not None:
+        logger.info(f"  📦 Using cached reel info for {shortcode or media_id}")
+        return info
 
+    info = _resolve_reel_info(page, shortcode, media_id)
+    if info:
+        _media_cache.set(key, info, expire=MEDIA_CACHE_TTL)
+    return info
+
+
+def _resolve_reel_info(page, shortcode: str, media_id: str = "") -> Optional[Dict]:
+    """Look up reel info via the media-info API, falling back to scraping the page."""
     try:
         reel_url = f"https://www.instagram.com/reel/{shortcode}/"
         logger.info(f"  📥 Fetching reel info: {reel_url}")
@@ -73,7 +114,7 @@ def download_reel(page, shortcode: str, media_id: str = "") -> Optional[Dict]:
             logger.error(f"  ❌ Could not fetch media info for {shortcode}")
 
             # Fallback: try to scrape the video URL from the page
-            return _download_reel_from_page(page, reel_url, shortcode)
+            return _fetch_reel_info_from_page(page, reel_url, shortcode)
 
         item = media_info["items"][0]
         
@@ -97,16 +138,32 @@ def download_reel(page, shortcode: str, media_id: str = "") -> Optional[Dict]:
             logger.error("  ❌ No video URL found.")
             return None
 
-        # Download the video
-        return _download_video_file(video_url, shortcode, original_caption, creator_username)
+        return {
+            "video_url": video_url,
+            "shortcode": shortcode,
+            "caption": original_caption,
+            "creator_username": creator_username,
+        }
 
     except Exception as e:
-        logger.error(f"  ❌ Failed to download reel: {e}")
+        logger.error(f"  ❌ Failed to fetch reel info: {e}")
         return None
 
 
-def _download_reel_from_page(page, reel_url: str, shortcode: str) -> Optional[Dict]:
-    """Fallback: navigate to the reel page and scrape the video URL."""
+def download_video(info: Dict) -> Optional[Dict]:
+    """
+    Download the video described by fetch_reel_info() to disk.
+
+    Safe to call from worker threads — it never touches the browser page.
+    """
+    ensure_downloads_dir()
+    return _download_video_file(
+        info["video_url"], info["shortcode"], info["caption"], info["creator_username"]
+    )
+
+
+def _fetch_reel_info_from_page(page, reel_url: str, shortcode: str) -> Optional[Dict]:
+    """Fallback: navigate to the reel page and scrape the video URL and creator."""
     try:
         logger.info("  Trying page scrape fallback...")
         page.goto(reel_url, wait_until="load", timeout=20000)
@@ -127,7 +184,12 @@ def _download_reel_from_page(page, reel_url: str, shortcode: str) -> Optional[Di
                 except Exception:
                     pass
 
-                return _download_video_file(video_url, shortcode, "", creator)
+                return {
+                    "video_url": video_url,
+                    "shortcode": shortcode,
+                    "caption": "",
+                    "creator_username": creator,
+                }
 
         logger.error("  ❌ Could not find video on page.")
         return None
@@ -136,21 +198,64 @@ def _download_reel_from_page(page, reel_url: str, shortcode: str) -> Optional[Di
         return None
 
 
+def _scratch_dir(content_length: int, use_shm: bool = True) -> str:
+    """
+    Pick where a download lands: RAM-backed /dev/shm for reels that fit in
+    its free space, else DOWNLOADS_DIR.
+    """
+    if not (use_shm and os.path.isdir(SHM_DIR) and 0 < content_length < SHM_MAX_BYTES):
+        return DOWNLOADS_DIR
+    try:
+        stat = os.statvfs(SHM_DIR)
+    except OSError:
+        return DOWNLOADS_DIR
+    # Leave room for the other download workers writing alongside this one
+    # (Docker's default /dev/shm is only 64 MB)
+    if content_length * DOWNLOAD_WORKERS > stat.f_bavail * stat.f_frsize:
+        return DOWNLOADS_DIR
+    return SHM_DIR
+
+
+def _stream_to_file(video_url: str, shortcode: str, use_shm: bool = True):
+    """Stream `video_url` to a fresh scratch file; returns (path, size) and removes the file on failure."""
+    filepath = None
+    try:
+        size = 0
+        with _http.stream("GET", video_url) as resp:
+            resp.raise_for_status()
+
+            content_length = int(resp.headers.get("content-length") or 0)
+            fd, filepath = tempfile.mkstemp(
+                prefix=f"{shortcode}-", suffix=".mp4", dir=_scratch_dir(content_length, use_shm)
+            )
+            try:
+                for chunk in resp.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    view = memoryview(chunk)
+                    while view:
+                        written = os.write(fd, view)
+                        view = view[written:]
+                    size += len(chunk)
+            finally:
+                os.close(fd)
+        return filepath, size
+    except Exception:
+        cleanup_file(filepath)
+        raise
+
+
 def _download_video_file(video_url: str, shortcode: str, caption: str, creator: str) -> Optional[Dict]:
-    """Download a video file from URL to disk."""
+    """Stream a video file from URL straight to a raw file descriptor."""
     try:
         logger.info("  Downloading video file...")
-        filename = f"{shortcode}.mp4"
-        filepath = os.path.join(DOWNLOADS_DIR, filename)
-
-        resp = requests.get(video_url, stream=True, timeout=60)
-        resp.raise_for_status()
 
-        with open(filepath, "wb") as f:
-            for chunk in resp.iter_content(chunk_size=8192):
-                f.write(chunk)
+        try:
+            filepath, size = _stream_to_file(video_url, shortcode)
+        except OSError as e:
+            # /dev/shm can still fill up under concurrent downloads (ENOSPC)
+            logger.warning(f"  ⚠️  Scratch write failed ({e}), retrying in {DOWNLOADS_DIR}/...")
+            filepath, size = _stream_to_file(video_url, shortcode, use_shm=False)
 
-        file_size_mb = os.path.getsize(filepath) / (1024 * 1024)
+        file_size_mb = size / (1024 * 1024)
         logger.info(f"  ✅ Downloaded: {filepath} ({file_size_mb:.1f} MB)")
 
         return {
@@ -164,7 +269,7 @@ def _download_video_file(video_url: str, shortcode: str, caption: str, creator:
 
 
 def cleanup_file(filepath):
-    """Remove a downloaded file after successful upload."""
+    """Remove a downloaded file (from DOWNLOADS_DIR or /dev/shm) after upload."""
     try:
         if filepath and os.path.exists(filepath):
             os.remove(filepath)
@@ -1,16 +1,35 @@
 """
 Tracks which DM messages have been processed to avoid duplicates.
-Uses a simple JSON file for persistence.
+Also keeps the inbox delta cursor (`seq_id` plus the newest item_id seen
+per thread).
+
+Processed IDs live in a bloom filter plus an exact window of the most recent
+IDs; Instagram item_ids are monotonic, so old ones never come back and the
+filter only has to answer for history.
+
+Persistence is an append-only log (one record per line) that is folded into
+a compact JSON snapshot and a bloom filter file every COMPACT_EVERY appends:
+
+    <message_id>                   processed message
+    #seq <json seq_id>             inbox seq_id moved
+    #thread <thread_id> <item_id>  thread cursor moved
 """
 
 import json
 import logging
 import os
-from typing import Set
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from pybloom_live import ScalableBloomFilter
 
 logger = logging.getLogger(__name__)
 
 TRACKER_FILE = "processed.json"
+COMPACT_EVERY = 100
+RECENT_WINDOW = 10000
+BLOOM_CAPACITY = 1_000_000
+BLOOM_ERROR_RATE = 1e-4
 
 
 class Tracker:
@@ -18,34 +37,146 @@ class Tracker:
 
     def __init__(self, filepath: str = TRACKER_FILE):
         self.filepath = filepath
-        self.processed_ids: Set[str] = set()
+        base = os.path.splitext(filepath)[0]
+        self.log_path = base + ".log"
+        self.bloom_path = base + ".bloom"
+        self.bloom = ScalableBloomFilter(initial_capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE)
+        self.recent: "OrderedDict[str, None]" = OrderedDict()
+        self.seq_id: Optional[int] = None
+        self.threads: Dict[str, str] = {}
+        # ETag (or body digest) of the last fully-handled inbox; not persisted
+        self.last_etag: Optional[str] = None
         self._load()
+        self._appends = 0
+        self._log = open(self.log_path, "a", buffering=8192)
 
     def _load(self):
-        """Load processed IDs from disk."""
+        """Load the bloom filter and JSON snapshot, then replay the append log on top."""
+        if os.path.exists(self.bloom_path):
+            try:
+                with open(self.bloom_path, "rb") as f:
+                    self.bloom = ScalableBloomFilter.fromfile(f)
+            except Exception:
+                logger.warning("⚠️  Corrupted bloom filter file. Rebuilding from snapshot.")
+
         if os.path.exists(self.filepath):
             try:
                 with open(self.filepath, "r") as f:
                     data = json.load(f)
-                    self.processed_ids = set(data.get("processed", []))
-                logger.info(f"📋 Loaded {len(self.processed_ids)} processed message IDs.")
+                    # "processed" is the full ID list written by older versions
+                    for message_id in data.get("processed", []) + data.get("recent", []):
+                        self._remember(message_id)
+                    self.seq_id = data.get("seq_id")
+                    self.threads = dict(data.get("threads", {}))
             except (json.JSONDecodeError, KeyError):
                 logger.warning("⚠️  Corrupted tracker file. Starting fresh.")
-                self.processed_ids = set()
+
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r") as f:
+                for line in f:
+                    self._replay(line.rstrip("\n"))
+
+        if len(self.bloom):
+            logger.info(f"📋 Loaded {len(self.bloom)} processed message IDs.")
         else:
             logger.info("📋 No processed messages yet. Starting fresh.")
 
-    def _save(self):
-        """Persist processed IDs to disk."""
-        with open(self.filepath, "w") as f:
-            json.dump({"processed": list(self.processed_ids)}, f, indent=2)
+    def _replay(self, line: str):
+        """Apply one append-log record to the in-memory state."""
+        if not line:
+            return
+        if line.startswith("#seq "):
+            try:
+                self.seq_id = json.loads(line[5:])
+            except json.JSONDecodeError:
+                pass
+        elif line.startswith("#thread "):
+            parts = line.split(" ")
+            if len(parts) == 3:
+                self.threads[parts[1]] = parts[2]
+        else:
+            self._remember(line)
+
+    def _remember(self, message_id: str):
+        """Add an ID to the bloom filter and the recent window."""
+        self.bloom.add(message_id)
+        self.recent[message_id] = None
+        self.recent.move_to_end(message_id)
+        if len(self.recent) > RECENT_WINDOW:
+            self.recent.popitem(last=False)
+
+    def _append(self, *records: str):
+        """Append records to the log with a single write, compacting periodically."""
+        self._log.write("".join(f"{record}\n" for record in records))
+        self._log.flush()
+        self._appends += len(records)
+        if self._appends >= COMPACT_EVERY:
+            self._compact()
+
+    def _compact(self):
+        """Fold the log into the bloom file and JSON snapshot, then truncate it."""
+        tmp_path = f"{self.bloom_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            self.bloom.tofile(f)
+        os.replace(tmp_path, self.bloom_path)
+
+        tmp_path = f"{self.filepath}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "recent": list(self.recent),
+                "seq_id": self.seq_id,
+                "threads": self.threads,
+            }, f, separators=(",", ":"))
+        os.replace(tmp_path, self.filepath)
+
+        self._log.close()
+        self._log = open(self.log_path, "w", buffering=8192)
+        self._appends = 0
+
+    def close(self):
+        """Compact and release the append log."""
+        self._compact()
+        self._log.close()
 
     def is_processed(self, message_id: str) -> bool:
         """Check if a message has already been processed."""
-        return str(message_id) in self.processed_ids
+        message_id = str(message_id)
+        return message_id in self.recent or message_id in self.bloom
+
+    def filter_unprocessed(self, message_ids: Iterable[str]) -> List[str]:
+        """Return the IDs not yet processed, in order, in a single pass."""
+        recent, bloom = self.recent, self.bloom
+        return [m for m in map(str, message_ids) if m not in recent and m not in bloom]
 
     def mark_processed(self, message_id: str):
         """Mark a message as processed and save."""
-        self.processed_ids.add(str(message_id))
-        self._save()
+        self._remember(str(message_id))
+        self._append(str(message_id))
         logger.debug(f"   Marked message {message_id} as processed.")
+
+    def mark_processed_many(self, message_ids: Iterable[str]):
+        """Mark several messages as processed with a single log write."""
+        records = [str(m) for m in message_ids]
+        if not records:
+            return
+        for message_id in records:
+            self._remember(message_id)
+        self._append(*records)
+
+    def last_item_id(self, thread_id: str) -> str:
+        """Newest item_id already scanned in a thread ("" if never scanned)."""
+        return self.threads.get(str(thread_id), "")
+
+    def update_cursor(self, seq_id=None, threads: Optional[Dict[str, str]] = None):
+        """Advance the inbox delta cursor, logging only what moved."""
+        records = []
+        if seq_id is not None and seq_id != self.seq_id:
+            self.seq_id = seq_id
+            records.append(f"#seq {json.dumps(seq_id)}")
+        for thread_id, item_id in (threads or {}).items():
+            thread_id = str(thread_id)
+            if self.threads.get(thread_id) != item_id:
+                self.threads[thread_id] = item_id
+                records.append(f"#thread {thread_id} {item_id}")
+        if records:
+            self._append(*records)
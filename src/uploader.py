@@ -10,15 +10,272 @@ from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Upload-dialog selectors, shared by the cached locators and wait_ready() calls
+NEW_POST_SELECTOR = 'svg[aria-label="New post"]'
+FILE_INPUT_SELECTOR = 'input[type="file"]'
+CROP_SELECTOR = 'svg[aria-label="Select crop"]'
+OK_SELECTOR = 'button:has-text("OK")'
+NEXT_SELECTOR = 'div[role="button"]:has-text("Next"), button:has-text("Next")'
+CAPTION_SELECTOR = 'div[aria-label="Write a caption..."], div[role="textbox"]'
+SHARE_SELECTOR = 'div[role="button"]:has-text("Share"), button:has-text("Share")'
+# :has-text() is case-insensitive, so this also covers "Select From Computer"
+SELECT_FILE_SELECTOR = 'button:has-text("Select from computer"), button:has-text("Select from gallery")'
+
+# Upper bound on Next clicks between file selection and the caption step
+MAX_UPLOAD_STEPS = 6
+
+# Share is done once the dialog confirms it, or once Instagram has closed the
+# dialog and dropped back to the feed. Checked every SHARE_POLL_MS, racing
+# the publish response.
+SHARE_POLL_MS = 250
+_SHARE_DONE_JS = """
+    () => {
+        const dialog = document.querySelector('div[role="dialog"]');
+        if (!dialog) {
+            return location.pathname === '/';
+        }
+        if (dialog.querySelector('img[alt*="checkmark"]')) {
+            return true;
+        }
+        return /Your reel has been shared|Post shared|Reel shared/.test(dialog.textContent);
+    }
+"""
+
+# Share completes when Instagram answers the configure (publish) call with
+# status "ok". The web client re-sends it while the video is still
+# transcoding, so interim "transcode not finished" replies are skipped.
+SHARE_RESPONSE_TIMEOUT_MS = 60000
+PUBLISH_URL_PARTS = ("/media/configure_to_clips", "/media/configure/")
+
 
 def build_caption(original_caption: str, creator_username: str) -> str:
     """Build repost caption with credit."""
-    parts = []
-    if original_caption.strip():
-        parts.append(original_caption.strip())
-    parts.append(f"\n📸 Credit: @{creator_username}")
-    parts.append("🔄 Reposted via DM")
-    return "\n".join(parts)
+    original = original_caption.strip()
+    footer = f"📸 Credit: @{creator_username}\n🔄 Reposted via DM"
+    return f"{original}\n\n{footer}" if original else footer
+
+
+def wait_ready(page, selector: str, timeout: int = 15000, state: str = "visible") -> bool:
+    """
+    Wait for `selector` to reach `state` instead of sleeping a fixed time.
+    Returns False (rather than raising) once the bounded timeout runs out.
+    """
+    try:
+        page.wait_for_selector(selector, state=state, timeout=timeout)
+        return True
+    except Exception:
+        return False
+
+
+def _wait_step_change(page, previous_title: str, timeout: int = 10000):
+    """Wait for the upload dialog's heading to move on from `previous_title`."""
+    try:
+        page.wait_for_function(
+            """(prev) => {
+                const h = document.querySelector('div[role="dialog"] h1');
+                return !h || h.textContent.trim() !== prev;
+            }""",
+            arg=previous_title,
+            timeout=timeout,
+        )
+    except Exception:
+        pass
+
+
+def _is_publish_response(response) -> bool:
+    """Match the configure call that publishes the reel."""
+    return response.request.method == "POST" and any(part in response.url for part in PUBLISH_URL_PARTS)
+
+
+def _publish_outcome(response):
+    """
+    Classify a configure response: True once published ("status": "ok"),
+    False on a definite failure, None for an interim reply (still
+    transcoding, 202, 5xx) that Instagram retries.
+    """
+    if response.status == 202 or response.status >= 500:
+        return None
+    try:
+        data = response.json()
+    except Exception:
+        return None if response.ok else False
+    if not isinstance(data, dict):
+        return None
+    if data.get("status") == "ok":
+        return True
+    if "transcode" in str(data.get("message", "")).lower():
+        return None
+    return False
+
+
+def _wait_for_publish(page, responses: list, timeout_ms: int):
+    """
+    Wait for a final outcome among the configure responses collected in
+    `responses`: True (published), False (failed), or None on timeout.
+    The dialog/feed check (_SHARE_DONE_JS) races it on every tick, so a
+    missed endpoint match doesn't hold a finished share for the full window.
+    """
+    deadline = time.monotonic() + timeout_ms / 1000
+    checked = 0
+    while True:
+        while checked < len(responses):
+            outcome = _publish_outcome(responses[checked])
+            checked += 1
+            if outcome is not None:
+                return outcome
+        if _share_done_on_page(page):
+            return True
+        if time.monotonic() >= deadline:
+            return None
+        # Responses are dispatched to the listener while Playwright waits
+        page.wait_for_timeout(SHARE_POLL_MS)
+
+
+def _share_done_on_page(page) -> bool:
+    """One evaluation of _SHARE_DONE_JS; False while the page is navigating."""
+    try:
+        return bool(page.evaluate(_SHARE_DONE_JS))
+    except Exception:
+        return False
+
+
+def _debug_screenshot(page, path: str):
+    """Save a viewport screenshot for debugging, only when DEBUG_SCREENSHOTS is set."""
+    if not os.getenv("DEBUG_SCREENSHOTS"):
+        return
+    try:
+        page.screenshot(path=path)
+    except Exception as e:
+        logger.debug(f"Debug screenshot failed: {e}")
+
+
+def _dialog_title(page) -> str:
+    try:
+        return (page.locator('div[role="dialog"] h1').first.text_content(timeout=1000) or "").strip()
+    except Exception:
+        return ""
+
+
+def _ready_to_create(page) -> bool:
+    """True if the page is a logged-in Instagram page with no dialog open."""
+    if not page.url.startswith("https://www.instagram.com/") or "/accounts/login" in page.url:
+        return False
+    return (
+        page.locator(NEW_POST_SELECTOR).count() > 0
+        and page.locator('div[role="dialog"]').count() == 0
+    )
+
+
+def _open_upload_dialog(page, file_input) -> bool:
+    """
+    Fallback path to the file input: Post from the Create dropdown, then the
+    "Select from computer" button if the input still isn't there.
+    """
+    wait_ready(page, 'span:text-is("Post")', timeout=5000)
+
+    # Click "Post" from the dropdown menu
+    logger.info("  Clicking 'Post' from dropdown...")
+    post_option = page.locator('span:text-is("Post")')
+    try:
+        post_option.first.click(timeout=5000)
+    except Exception:
+        # Maybe it went straight to the upload dialog
+        logger.info("  No dropdown — may have opened upload dialog directly.")
+
+    wait_ready(page, FILE_INPUT_SELECTOR, timeout=10000, state="attached")
+
+    # Now the upload dialog should be open
+    # Look for file input OR "Select from computer" button
+    if file_input.count() == 0:
+        # Try clicking "Select from computer" or "Select from gallery" —
+        # one union selector waits for whichever label this locale uses
+        try:
+            select_btn = page.locator(SELECT_FILE_SELECTOR).first
+            select_btn.wait_for(state="visible", timeout=5000)
+            select_btn.click()
+            wait_ready(page, FILE_INPUT_SELECTOR, timeout=5000, state="attached")
+        except Exception:
+            pass
+
+    if file_input.count() == 0:
+        logger.error("  ❌ File input not found after opening upload dialog.")
+        _debug_screenshot(page, "debug_upload_fail.png")
+        return False
+    return True
+
+
+def _dismiss_reels_notice(ok_btn):
+    """Dismiss the "Video posts are now shared as reels" OK modal if it's up."""
+    try:
+        if ok_btn.first.is_visible():
+            ok_btn.first.click(force=True)
+            logger.info("  Dismissed 'shared as reels' modal")
+            ok_btn.first.wait_for(state="hidden", timeout=5000)
+    except Exception:
+        pass
+
+
+def _set_original_aspect(page, aspect_btn):
+    """Crop step: switch the aspect ratio to Original."""
+    try:
+        # Click aspect ratio button (SVG with aria-label="Select crop")
+        if aspect_btn.count() > 0 and aspect_btn.first.is_visible():
+            # Click the button containing the SVG
+            page.evaluate("(el) => el.closest('button').click()", aspect_btn.first.element_handle())
+            wait_ready(page, 'span:text-is("Original")', timeout=5000)
+
+            # Click "Original" (usually the first option or specifically labeled)
+            page.evaluate('''() => {
+                const spans = Array.from(document.querySelectorAll('span, div'));
+                const orig = spans.find(el => el.textContent.trim() === 'Original');
+                if (orig) orig.click();
+            }''')
+            logger.info("  Set aspect ratio to Original (9:16)")
+    except Exception as e:
+        logger.warning(f"  ⚠️ Could not set aspect ratio: {e}")
+
+
+def _advance_to_caption(page, ok_btn, aspect_btn, next_btn):
+    """
+    Walk the upload dialog from file selection to the caption step.
+
+    Each pass reads the dialog title, runs that step's handler from
+    `handlers`, and clicks Next; it stops once there's no Next button,
+    i.e. the caption step. Unknown titles just get Next, apart from the
+    crop button, which is handled wherever it shows up first.
+    """
+    cropped = False
+
+    def crop():
+        nonlocal cropped
+        if not cropped:
+            _set_original_aspect(page, aspect_btn)
+            cropped = True
+
+    def unknown_step():
+        if not cropped and aspect_btn.count() > 0:
+            crop()
+
+    handlers = {
+        "Crop": crop,
+        "Edit": lambda: None,
+    }
+
+    for _ in range(MAX_UPLOAD_STEPS):
+        _dismiss_reels_notice(ok_btn)
+
+        # Look for Next button — or the caption box, once past the last step
+        wait_ready(page, f'{NEXT_SELECTOR}, div[aria-label="Write a caption..."]', timeout=5000)
+        try:
+            if not next_btn.first.is_visible():
+                return
+            title = _dialog_title(page)
+            handlers.get(title, unknown_step)()
+            next_btn.first.click(force=True)
+            logger.info(f"  Clicked Next ({title or 'step'})")
+            _wait_step_change(page, title)
+        except Exception:
+            return
 
 
 def upload_reel(page, video_path: str, caption: str) -> bool:
@@ -26,21 +283,34 @@ def upload_reel(page, video_path: str, caption: str) -> bool:
     Upload a video as a Reel via Instagram's web interface.
     """
     try:
-        video_path = os.path.abspath(video_path)
-        if not os.path.exists(video_path):
-            logger.error(f"  ❌ Video file not found: {video_path}")
+        # One stat() gives both the existence check and the size
+        video = Path(video_path).resolve()
+        try:
+            file_size_mb = video.stat().st_size / (1024 * 1024)
+        except FileNotFoundError:
+            logger.error(f"  ❌ Video file not found: {video}")
             return False
-
-        file_size_mb = os.path.getsize(video_path) / (1024 * 1024)
+        video_path = str(video)
         logger.info(f"  📤 Uploading reel ({file_size_mb:.1f} MB)...")
 
-        # Navigate to Instagram home
-        page.goto("https://www.instagram.com/", wait_until="load", timeout=30000)
-        page.wait_for_timeout(3000)
+        # Build each locator once; they resolve lazily on every use
+        file_input = page.locator(FILE_INPUT_SELECTOR)
+        ok_btn = page.locator(OK_SELECTOR)
+        aspect_btn = page.locator(CROP_SELECTOR)
+        next_btn = page.locator(NEXT_SELECTOR)
+        caption_area = page.locator(CAPTION_SELECTOR)
+
+        # A warm pool page is usually still on Instagram with the Create button
+        # up; only navigate when it isn't, or a dialog from the last upload is open
+        if not _ready_to_create(page):
+            # Navigate to Instagram home — the Create button is all we need, so
+            # don't wait for the feed's images and analytics to finish loading
+            page.goto("https://www.instagram.com/", wait_until="domcontentloaded", timeout=30000)
+            wait_ready(page, NEW_POST_SELECTOR)
 
         # Click the "Create" button (opens a dropdown menu)
         logger.info("  Clicking Create...")
-        create_btn = page.locator('svg[aria-label="New post"]')
+        create_btn = page.locator(NEW_POST_SELECTOR)
         if create_btn.count() > 0:
             create_btn.first.click()
         else:
@@ -51,135 +321,92 @@ def upload_reel(page, video_path: str, caption: str) -> bool:
                 logger.error("  ❌ Could not find Create button.")
                 return False
 
-        page.wait_for_timeout(2000)
-
-        # Click "Post" from the dropdown menu
-        logger.info("  Clicking 'Post' from dropdown...")
-        post_option = page.locator('span:text-is("Post")')
+        # The file input usually already sits hidden in the DOM once Create
+        # is open — set it directly and only walk the Post dropdown if not
         try:
-            post_option.first.click(timeout=5000)
+            file_input.first.set_input_files(video_path, timeout=2000)
+            logger.info("  Set file on the existing input.")
         except Exception:
-            # Maybe it went straight to the upload dialog
-            logger.info("  No dropdown — may have opened upload dialog directly.")
-        
-        page.wait_for_timeout(3000)
-
-        # Now the upload dialog should be open
-        # Look for file input OR "Select from computer" button
-        file_input = page.locator('input[type="file"]')
-        
-        if file_input.count() == 0:
-            # Try clicking "Select from computer" or "Select from gallery"
-            for btn_text in ["Select from computer", "Select From Computer", "Select from gallery"]:
-                try:
-                    btn = page.locator(f'button:has-text("{btn_text}")')
-                    if btn.first.is_visible(timeout=3000):
-                        btn.first.click()
-                        page.wait_for_timeout(2000)
-                        break
-                except Exception:
-                    continue
-
-        # Re-check for file input
-        file_input = page.locator('input[type="file"]')
-        if file_input.count() == 0:
-            logger.error("  ❌ File input not found after opening upload dialog.")
-            page.screenshot(path="debug_upload_fail.png")
-            return False
+            if not _open_upload_dialog(page, file_input):
+                return False
+            logger.info("  Setting file on input...")
+            file_input.first.set_input_files(video_path)
 
-        logger.info("  Setting file on input...")
-        file_input.first.set_input_files(video_path)
-        
         logger.info("  File set, waiting for processing...")
-        page.wait_for_timeout(5000)
-
-        # Click through the Next/Continue buttons and handle cropping/aspect ratio
-        for step in range(5):
-            page.wait_for_timeout(2000)
-            
-            # Look for and dismiss "Video posts are now shared as reels" OK button
-            try:
-                ok_btn = page.locator('button:has-text("OK")')
-                if ok_btn.first.is_visible(timeout=3000):
-                    ok_btn.first.click(force=True)
-                    logger.info("  Dismissed 'shared as reels' modal")
-                    page.wait_for_timeout(2000)
-            except Exception:
-                pass
-            
-            # Step 1: Cropping step. Select original aspect ratio.
-            if step == 0:
-                try:
-                    # Click aspect ratio button (SVG with aria-label="Select crop")
-                    aspect_btn = page.locator('svg[aria-label="Select crop"]')
-                    if aspect_btn.count() > 0 and aspect_btn.first.is_visible(timeout=2000):
-                        # Click the button containing the SVG
-                        page.evaluate("(el) => el.closest('button').click()", aspect_btn.first.element_handle())
-                        page.wait_for_timeout(1000)
-                        
-                        # Click "Original" (usually the first option or specifically labeled)
-                        page.evaluate('''() => {
-                            const spans = Array.from(document.querySelectorAll('span, div'));
-                            const orig = spans.find(el => el.textContent.trim() === 'Original');
-                            if (orig) orig.click();
-                        }''')
-                        logger.info("  Set aspect ratio to Original (9:16)")
-                        page.wait_for_timeout(1000)
-                except Exception as e:
-                    logger.warning(f"  ⚠️ Could not set aspect ratio: {e}")
+        wait_ready(page, f"{CROP_SELECTOR}, {NEXT_SELECTOR}", timeout=30000)
 
-            try:
-                # Look for Next button
-                next_btn = page.locator('div[role="button"]:has-text("Next"), button:has-text("Next")')
-                if next_btn.first.is_visible(timeout=3000):
-                    next_btn.first.click(force=True)
-                    logger.info(f"  Clicked Next (step {step + 1})")
-                else:
-                    break
-            except Exception:
-                break
+        # Click through the dialog's steps until the caption box shows
+        _advance_to_caption(page, ok_btn, aspect_btn, next_btn)
 
         # Fill in the caption
         try:
-            caption_area = page.locator('div[aria-label="Write a caption..."], div[role="textbox"]')
-            if caption_area.first.is_visible(timeout=5000):
+            if wait_ready(page, CAPTION_SELECTOR, timeout=5000):
                 caption_area.first.click(force=True)
-                page.wait_for_timeout(500)
-                page.keyboard.type(caption, delay=5)
+                # Insert the whole caption in one call instead of per-key typing
+                inserted = caption_area.first.evaluate(
+                    "(el, text) => { el.focus(); return document.execCommand('insertText', false, text); }",
+                    caption,
+                )
+                if not inserted:
+                    page.keyboard.insert_text(caption)
                 logger.info("  Caption filled.")
-                page.wait_for_timeout(1000)
         except Exception as e:
             logger.warning(f"  ⚠️ Could not fill caption: {e}")
 
         # Click Share
         logger.info("  Attempting to click Share...")
+        clicked = False
         try:
             # We look inside the dialog specifically if it exists, to avoid background elements
             dialog = page.locator('div[role="dialog"]')
             if dialog.count() > 0 and dialog.first.is_visible():
-                share_btn = dialog.locator('div[role="button"]:has-text("Share"), button:has-text("Share")')
+                share_btn = dialog.locator(SHARE_SELECTOR)
             else:
-                share_btn = page.locator('div[role="button"]:has-text("Share"), button:has-text("Share")')
+                share_btn = page.locator(SHARE_SELECTOR)
             
-            # This natively waits up to 10 seconds for the element to become visible, enabled, and unobstructed
-            share_btn.first.click(timeout=10000)
-            logger.info("  Clicked Share!")
+            # Collect configure responses from before the click so none are missed;
+            # interim "still transcoding" replies come first, the final one later
+            publish_responses = []
+
+            def on_response(response):
+                if _is_publish_response(response):
+                    publish_responses.append(response)
+
+            page.on("response", on_response)
+            try:
+                # This natively waits up to 10 seconds for the element to become visible, enabled, and unobstructed
+                share_btn.first.click(timeout=10000)
+                clicked = True
+                logger.info("  Clicked Share!")
+                logger.info("  Waiting for upload to complete (this may take a few minutes)...")
+                published = _wait_for_publish(page, publish_responses, SHARE_RESPONSE_TIMEOUT_MS)
+            finally:
+                page.remove_listener("response", on_response)
+
+            if published:
+                logger.info("  ✅ Reel uploaded successfully!")
+                return True
+            if published is False:
+                logger.error("  ❌ Instagram rejected the publish request.")
+                _debug_screenshot(page, "debug_publish_failed.png")
+                return False
+            logger.warning("  ⚠️ No final publish response seen, checking the page...")
         except Exception as e:
-            logger.error(f"  ❌ Could not click Share: {e}")
-            page.screenshot(path="debug_no_share.png")
-            return False
+            if not clicked:
+                logger.error(f"  ❌ Could not click Share: {e}")
+                _debug_screenshot(page, "debug_no_share.png")
+                return False
+            logger.warning(f"  ⚠️ Could not read the publish response ({e}), checking the page...")
 
-        # Wait for upload to complete
-        logger.info("  Waiting for upload to complete (this may take a few minutes)...")
+        # Last look at the dialog, e.g. when reading the publish response failed
         try:
-            # We look for the "Your reel has been shared" or similar success indicator
-            success = page.locator('span:has-text("Your reel has been shared"), span:has-text("Post shared"), img[alt*="checkmark"], span:has-text("Reel shared")')
-            success.first.wait_for(state="visible", timeout=60000)
+            # Race the "Your reel has been shared" text against the return to the feed
+            page.wait_for_function(_SHARE_DONE_JS, polling=SHARE_POLL_MS, timeout=5000)
             logger.info("  ✅ Reel uploaded successfully!")
             return True
         except Exception as e:
             logger.warning("  ⚠️ Did not see success confirmation, assuming success in background.")
-            page.screenshot(path="debug_upload_timeout.png")
+            _debug_screenshot(page, "debug_upload_timeout.png")
             page.wait_for_timeout(30000)  # Extra buffer for background processing
             return True
 
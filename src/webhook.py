@@ -1,38 +1,135 @@
 import requests
 import logging
 import os
+import queue
+import threading
+import time
+from requests.adapters import HTTPAdapter
 from .config import load_config
 
 logger = logging.getLogger(__name__)
 
-# Track the active webhook URL from config
+# One keep-alive session for all progress posts, so status updates reuse the
+# TLS connection instead of handshaking on every call
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# Posts are handed to a background worker so a slow endpoint never stalls
+# the upload flow; the bounded queue caps memory if the endpoint is down.
+WEBHOOK_QUEUE_SIZE = 64
+_queue: "queue.Queue[dict]" = queue.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+
+# Updates for the same (status, reel) within this window are held back, and
+# the newest one is posted once the window closes; exact repeats of the last
+# post are dropped, and a status change always goes out.
+WEBHOOK_DEBOUNCE_SECONDS = 2.0
+_last_key = None
+_last_payload = None
+_last_send_ts = 0.0
+
+# Track the active webhook URL from config (resolved once, on first use)
 _webhook_url = None
+_webhook_ready = False
+_webhook_lock = threading.Lock()
 
 def init_webhook():
-    global _webhook_url
-    config = load_config()
-    _webhook_url = config.get("WEBHOOK_URL", "").strip()
-    if _webhook_url and not _webhook_url.endswith("/api/progress"):
-        _webhook_url = _webhook_url.rstrip("/") + "/api/progress"
+    """Resolve the progress endpoint from config; safe to call more than once."""
+    global _webhook_url, _webhook_ready
+    if _webhook_ready:
+        return
+    with _webhook_lock:
+        if _webhook_ready:
+            return
+        config = load_config()
+        url = config.get("WEBHOOK_URL", "").strip()
+        if url and not url.endswith("/api/progress"):
+            url = url.rstrip("/") + "/api/progress"
+        _webhook_url = url
+        _webhook_ready = True
+
+def _send(payload: dict):
+    """Post one payload and record it as the last one sent."""
+    global _last_key, _last_payload, _last_send_ts
+    try:
+        _session.post(_webhook_url, json=payload, timeout=5)
+        _last_key = (payload["status"], payload.get("reelId"))
+        _last_payload, _last_send_ts = payload, time.monotonic()
+    except Exception as e:
+        logger.debug(f"Webhook failed: {e}")
+
+def _post_worker():
+    """Drain the progress queue, posting each payload in order."""
+    # Newest update held back by the debounce; its queue task stays open
+    # until it is sent or superseded, so flush_webhook() waits for it.
+    pending = None
+    while True:
+        timeout = None
+        if pending is not None:
+            timeout = max(0.0, _last_send_ts + WEBHOOK_DEBOUNCE_SECONDS - time.monotonic())
+        try:
+            payload = _queue.get(timeout=timeout)
+        except queue.Empty:
+            _send(pending)
+            pending = None
+            _queue.task_done()
+            continue
+
+        if pending is not None:
+            pending = None
+            _queue.task_done()
+
+        key = (payload["status"], payload.get("reelId"))
+        if key == _last_key and time.monotonic() - _last_send_ts < WEBHOOK_DEBOUNCE_SECONDS:
+            if payload != _last_payload:
+                pending = payload
+                continue
+        else:
+            _send(payload)
+        _queue.task_done()
+
+threading.Thread(target=_post_worker, name="webhook", daemon=True).start()
 
 def report_progress(status: str, message: str, reel_id: str = None, sender: str = None):
     """
-    Sends the current bot state to the Vercel progress UI.
+    Queues the current bot state for the Vercel progress UI and returns at once.
     status: 'idle', 'downloading', 'uploading', 'completed', 'error'
+
+    An update for the same status and reel as the one still waiting at the
+    back of the queue replaces it instead of queueing another post.
     """
+    if not _webhook_ready:
+        init_webhook()
     if not _webhook_url:
         return
-        
+
+    payload = {
+        "status": status,
+        "message": message
+    }
+    if reel_id:
+        payload["reelId"] = reel_id
+    if sender:
+        payload["sender"] = sender
+
+    with _queue.mutex:
+        pending = _queue.queue[-1] if _queue.queue else None
+        if pending and pending["status"] == status and pending.get("reelId") == payload.get("reelId"):
+            pending.clear()
+            pending.update(payload)
+            return
+
     try:
-        payload = {
-            "status": status,
-            "message": message
-        }
-        if reel_id:
-            payload["reelId"] = reel_id
-        if sender:
-            payload["sender"] = sender
-            
-        requests.post(_webhook_url, json=payload, timeout=5)
-    except Exception as e:
-        logger.debug(f"Webhook failed: {e}")
+        _queue.put_nowait(payload)
+    except queue.Full:
+        logger.debug("Webhook queue full, dropping update.")
+
+def flush_webhook(timeout: float = 5.0) -> bool:
+    """Wait up to `timeout` seconds for queued updates to be posted."""
+    deadline = time.monotonic() + timeout
+    with _queue.all_tasks_done:
+        while _queue.unfinished_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            _queue.all_tasks_done.wait(remaining)
+    return True